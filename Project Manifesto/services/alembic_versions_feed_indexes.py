@@ -0,0 +1,29 @@
+"""Add feed indexes to virtual_media
+
+Revision ID: add_virtualmedia_feed_indexes
+Revises: add_task_retry_fields
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'add_virtualmedia_feed_indexes'
+down_revision: Union[str, None] = 'add_task_retry_fields'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_virtualmedia_tmdb_id_updated_at', 'virtualmedia', ['tmdb_id', 'updated_at'])
+    op.create_index('ix_virtualmedia_updated_at', 'virtualmedia', ['updated_at'])
+    # Covered by the leading column of ix_virtualmedia_tmdb_id_updated_at.
+    op.drop_index('ix_virtualmedia_tmdb_id', table_name='virtualmedia', if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index('ix_virtualmedia_tmdb_id', 'virtualmedia', ['tmdb_id'])
+    op.drop_index('ix_virtualmedia_updated_at', table_name='virtualmedia')
+    op.drop_index('ix_virtualmedia_tmdb_id_updated_at', table_name='virtualmedia')
@@ -1,15 +1,16 @@
+import asyncio
 import hashlib
-import json
 import os
 import re
 from datetime import datetime
-from typing import Iterable, Optional, List
+from typing import Any, Dict, Iterable, Optional, List, Union
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+import orjson
 import redis.asyncio as redis
-from sqlalchemy import select, func
+from sqlalchemy import func, or_, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -33,7 +34,7 @@ from app.services.share_parser import (
     QuarkShareParser,
     QuarkShareError,
 )
-from app.services.telegram_searcher import get_channels, searcher
+from app.services.telegram_searcher import get_channels, get_searcher
 
 VIDEO_EXTENSIONS = {
     ".mp4",
@@ -55,7 +56,16 @@ UNKNOWN_TMDB_ID = 0
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 TRANSFER_QUEUE_KEY = os.getenv("TRANSFER_QUEUE_KEY", "queue:transfer")
 DEAD_QUEUE_KEY = os.getenv("TRANSFER_DEAD_QUEUE_KEY", "queue:transfer:dead")
+SHARE_CODE_RE = re.compile(r"/s/([A-Za-z0-9]+)")
 HOME_FEED_LIMIT = int(os.getenv("HOME_FEED_LIMIT", "24"))
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+# Task and resource status change right after a provision or save, so by
+# default every request revalidates against the ETag instead of being served
+# stale from a browser or shared cache.
+HTTP_CACHE_CONTROL = (
+    f"private, max-age={HTTP_CACHE_MAX_AGE}" if HTTP_CACHE_MAX_AGE > 0 else "private, no-cache"
+)
+UPSERT_LOOKUP_CHUNK = 500
 
 share_router = APIRouter(prefix="/api/v1/share", tags=["share"])
 media_router = APIRouter(prefix="/api/v1/media", tags=["media"])
@@ -66,6 +76,8 @@ home_router = APIRouter(prefix="/api/v1", tags=["home"])
 
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
 
+_parse_inflight: Dict[str, "asyncio.Task[List[dict]]"] = {}
+
 
 def _get_query_param(request: Request, *names: str) -> Optional[str]:
     for name in names:
@@ -79,7 +91,7 @@ def _apply_passcode(url: str, passcode: str) -> str:
     if not passcode:
         return url
 
-    if "://" not in url and "/" not in url:
+    if "/" not in url:
         return f"https://pan.quark.cn/s/{url}?pwd={passcode}"
 
     parsed = urlparse(url)
@@ -90,11 +102,12 @@ def _apply_passcode(url: str, passcode: str) -> str:
 
 
 def _extract_share_code(share_url: str) -> str:
-    if "://" not in share_url and "/" not in share_url:
+    if "/" not in share_url:
         return share_url.strip()
 
-    parsed = urlparse(share_url)
-    match = re.search(r"/s/([A-Za-z0-9]+)", parsed.path)
+    # The code sits in the path, which ends at the query or fragment; no
+    # need for a full urlparse.
+    match = SHARE_CODE_RE.search(share_url.partition("?")[0].partition("#")[0])
     if match:
         return match.group(1)
     return "share"
@@ -107,16 +120,22 @@ def _sanitize_segment(value: str, fallback: str) -> str:
 
 
 def _resolve_share_title(files: Iterable[dict], share_url: str) -> str:
-    top_levels = set()
+    # Only a single shared top-level folder names the share, so stop at the
+    # first path that disagrees instead of collecting every top level.
+    top_level = None
     for item in files:
-        path = item.get("path") or ""
-        normalized = path.strip("/")
+        normalized = (item.get("path") or "").strip("/")
         if not normalized:
             continue
-        top_levels.add(normalized.split("/", 1)[0])
-
-    if len(top_levels) == 1:
-        return _sanitize_segment(next(iter(top_levels)), "share")
+        segment = normalized.partition("/")[0]
+        if top_level is None:
+            top_level = segment
+        elif segment != top_level:
+            top_level = None
+            break
+
+    if top_level is not None:
+        return _sanitize_segment(top_level, "share")
     return _sanitize_segment(_extract_share_code(share_url), "share")
 
 
@@ -163,14 +182,24 @@ def _build_virtual_link_path(
     return f"{root}/tmdb-{tmdb_id}/{title_segment}-{link_segment}"
 
 
+_RESOURCE_STATUS = {
+    TaskStatus.completed: "MATERIALIZED",
+    TaskStatus.processing: "PROVISIONING",
+    TaskStatus.failed: "FAILED",
+}
+
+_TASK_PROGRESS = {
+    TaskStatus.pending: 0.1,
+    TaskStatus.processing: 0.5,
+    TaskStatus.completed: 1.0,
+    TaskStatus.failed: 0.0,
+}
+
+
 def _map_resource_status(media: VirtualMedia) -> str:
-    if media.is_archived or media.task_status == TaskStatus.completed:
+    if media.is_archived:
         return "MATERIALIZED"
-    if media.task_status == TaskStatus.processing:
-        return "PROVISIONING"
-    if media.task_status == TaskStatus.failed:
-        return "FAILED"
-    return "VIRTUAL"
+    return _RESOURCE_STATUS.get(media.task_status, "VIRTUAL")
 
 
 def _build_media_item(media: VirtualMedia) -> MediaItem:
@@ -197,18 +226,27 @@ def _build_resource_item(media: VirtualMedia) -> MediaResourceItem:
     )
 
 
-def _task_progress(status: TaskStatus) -> Optional[float]:
-    if status == TaskStatus.pending:
-        return 0.1
-    if status == TaskStatus.processing:
-        return 0.5
-    if status == TaskStatus.completed:
-        return 1.0
-    if status == TaskStatus.failed:
-        return 0.0
+def _compute_etag(content: Any) -> str:
+    digest = hashlib.blake2b(orjson.dumps(content), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _check_not_modified(request: Request, response: Response, content: Any) -> Optional[Response]:
+    etag = _compute_etag(content)
+    headers = {"ETag": etag, "Cache-Control": HTTP_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
     return None
 
 
+def _task_progress(status: TaskStatus) -> Optional[float]:
+    return _TASK_PROGRESS.get(status)
+
+
 def _build_task_record(media: VirtualMedia, link_id: Optional[str]) -> TaskRecordResponse:
     return TaskRecordResponse(
         task_id=media.task_id or "",
@@ -230,32 +268,57 @@ async def _upsert_virtual_media(
     share_url: str,
     share_title: str,
 ) -> None:
-    wrote = False
-    for item in files:
-        if not _should_store_file(item):
-            continue
+    rows = [
+        (
+            _build_virtual_path(share_title, item.get("name") or ""),
+            item.get("fid") or "",
+            item.get("share_fid_token") or "",
+        )
+        for item in files
+        if _should_store_file(item)
+    ]
+    if not rows:
+        return
 
-        file_name = item.get("name") or ""
-        virtual_path = _build_virtual_path(share_title, file_name)
+    # Prefetch existing rows with chunked IN queries instead of one SELECT
+    # per file.
+    paths = list(dict.fromkeys(row[0] for row in rows))
+    existing_by_path: Dict[str, VirtualMedia] = {}
+    for start in range(0, len(paths), UPSERT_LOOKUP_CHUNK):
         result = await session.execute(
-            select(VirtualMedia).where(VirtualMedia.virtual_path == virtual_path)
+            select(VirtualMedia).where(
+                VirtualMedia.virtual_path.in_(paths[start:start + UPSERT_LOOKUP_CHUNK])
+            )
         )
-        existing = result.scalar_one_or_none()
+        for media in result.scalars():
+            existing_by_path[media.virtual_path] = media
+
+    wrote = False
+    for virtual_path, original_fid, share_fid_token in rows:
+        existing = existing_by_path.get(virtual_path)
         if existing:
+            # Re-parsing an unchanged share is common; only touch rows whose
+            # link data actually changed so no-op parses skip the commit.
+            if (
+                existing.share_url == share_url
+                and existing.original_fid == original_fid
+                and existing.share_fid_token == share_fid_token
+            ):
+                continue
             existing.share_url = share_url
-            existing.original_fid = item.get("fid") or ""
-            existing.share_fid_token = item.get("share_fid_token") or ""
+            existing.original_fid = original_fid
+            existing.share_fid_token = share_fid_token
         else:
-            session.add(
-                VirtualMedia(
-                    tmdb_id=UNKNOWN_TMDB_ID,
-                    title=share_title,
-                    share_url=share_url,
-                    original_fid=item.get("fid") or "",
-                    share_fid_token=item.get("share_fid_token") or "",
-                    virtual_path=virtual_path,
-                )
+            media = VirtualMedia(
+                tmdb_id=UNKNOWN_TMDB_ID,
+                title=share_title,
+                share_url=share_url,
+                original_fid=original_fid,
+                share_fid_token=share_fid_token,
+                virtual_path=virtual_path,
             )
+            session.add(media)
+            existing_by_path[virtual_path] = media
         wrote = True
 
     if not wrote:
@@ -267,17 +330,38 @@ async def _upsert_virtual_media(
         await session.rollback()
 
 
+async def _fetch_share_files(client: Any, share_url: str) -> List[dict]:
+    cookie = os.getenv("QUARK_COOKIE", "")
+    async with QuarkShareParser(
+        cookie=cookie if cookie else None,
+        client=client,
+    ) as parser:
+        return await parser.parse_share_link(share_url)
+
+
+async def _parse_share_files(client: Any, share_url: str) -> List[dict]:
+    # Concurrent parses of the same link share a single tree walk.
+    task = _parse_inflight.get(share_url)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_share_files(client, share_url))
+        _parse_inflight[share_url] = task
+        task.add_done_callback(lambda _: _parse_inflight.pop(share_url, None))
+    return await asyncio.shield(task)
+
+
 @share_router.post("/parse", response_model=ShareParseResponse)
 async def parse_share_link(
     payload: ShareParseRequest,
+    request: Request,
     session: AsyncSession = Depends(get_session),
 ) -> ShareParseResponse:
-    share_url = _apply_passcode(payload.url, payload.passcode or "")
-    cookie = os.getenv("QUARK_COOKIE", "")
+    # Links copied from the browser carry a "#/list/share/..." fragment for
+    # the folder being viewed; it is client-side only, so drop it to share
+    # in-flight parses and stored rows with the bare link.
+    share_url = _apply_passcode(payload.url.partition("#")[0], payload.passcode or "")
 
     try:
-        async with QuarkShareParser(cookie=cookie if cookie else None) as parser:
-            files = await parser.parse_share_link(share_url)
+        files = await _parse_share_files(request.app.state.share_client, share_url)
         share_title = _resolve_share_title(files, share_url)
         await _upsert_virtual_media(session, files, share_url, share_title)
         return ShareParseResponse(total_count=len(files), files=files)
@@ -293,29 +377,63 @@ async def parse_share_link(
 
 @home_router.get("/home", response_model=HomeFeedResponse)
 async def get_home_feed(
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_session),
 ):
+    # Dedupe by tmdb_id (latest row wins) and cap each section in SQL, so
+    # only the rows that end up in the feed are loaded.
+    is_favorite = or_(
+        VirtualMedia.is_archived,
+        VirtualMedia.task_status == TaskStatus.completed,
+    )
+    latest = select(
+        VirtualMedia.id,
+        VirtualMedia.updated_at,
+        is_favorite.label("is_favorite"),
+        func.row_number()
+        .over(partition_by=VirtualMedia.tmdb_id, order_by=VirtualMedia.updated_at.desc())
+        .label("tmdb_rank"),
+    ).subquery()
+    ranked = (
+        select(
+            latest.c.id,
+            latest.c.is_favorite,
+            func.row_number()
+            .over(partition_by=latest.c.is_favorite, order_by=latest.c.updated_at.desc())
+            .label("feed_rank"),
+        )
+        .where(latest.c.tmdb_rank == 1)
+        .subquery()
+    )
     result = await session.execute(
-        select(VirtualMedia).order_by(VirtualMedia.updated_at.desc())
+        select(VirtualMedia, ranked.c.is_favorite)
+        .join(ranked, ranked.c.id == VirtualMedia.id)
+        .where(ranked.c.feed_rank <= HOME_FEED_LIMIT)
+        .order_by(VirtualMedia.updated_at.desc())
     )
-    medias = result.scalars().all()
     favorites: List[MediaItem] = []
     trending: List[MediaItem] = []
-    seen_tmdb: set[int] = set()
 
-    for media in medias:
-        if media.tmdb_id in seen_tmdb:
-            continue
-        seen_tmdb.add(media.tmdb_id)
+    for media, favorite in result.all():
         item = _build_media_item(media)
-        if media.is_archived or media.task_status == TaskStatus.completed:
+        if favorite:
             favorites.append(item)
         else:
             trending.append(item)
 
+    # updated_at is a render timestamp, so the ETag covers the items only.
+    not_modified = _check_not_modified(
+        request,
+        response,
+        [[item.model_dump() for item in favorites], [item.model_dump() for item in trending]],
+    )
+    if not_modified:
+        return not_modified
+
     return HomeFeedResponse(
-        favorites=favorites[:HOME_FEED_LIMIT],
-        trending=trending[:HOME_FEED_LIMIT],
+        favorites=favorites,
+        trending=trending,
         updated_at=datetime.utcnow().isoformat(),
     )
 
@@ -323,6 +441,8 @@ async def get_home_feed(
 @media_router.get("/{tmdb_id}", response_model=MediaDetailResponse)
 async def get_media_detail(
     tmdb_id: int,
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_session),
 ):
     result = await session.execute(
@@ -336,11 +456,15 @@ async def get_media_detail(
 
     primary = medias[0]
     resources = [_build_resource_item(media) for media in medias]
-    return MediaDetailResponse(
+    detail = MediaDetailResponse(
         tmdb_id=str(tmdb_id),
         title=primary.title,
         resources=resources,
     )
+    not_modified = _check_not_modified(request, response, detail.model_dump())
+    if not_modified:
+        return not_modified
+    return detail
 
 
 @media_router.post("/{tmdb_id}/links/virtual", response_model=SaveVirtualLinkResponse)
@@ -465,7 +589,7 @@ async def provision_media(
     }
 
     try:
-        await redis_client.lpush(TRANSFER_QUEUE_KEY, json.dumps(payload_data))
+        await redis_client.lpush(TRANSFER_QUEUE_KEY, orjson.dumps(payload_data))
     except redis.RedisError as exc:
         media.task_status = TaskStatus.failed
         media.error_message = f"Failed to enqueue: {str(exc)}"
@@ -490,8 +614,11 @@ async def get_task_stats(
     )
     stats = {row.task_status: row.count for row in result}
     
-    queue_size = await redis_client.llen(TRANSFER_QUEUE_KEY)
-    dead_queue_size = await redis_client.llen(DEAD_QUEUE_KEY)
+    # Both queue lengths in one round trip.
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.llen(TRANSFER_QUEUE_KEY)
+        pipe.llen(DEAD_QUEUE_KEY)
+        queue_size, dead_queue_size = await pipe.execute()
     
     return {
         "by_status": stats,
@@ -525,7 +652,7 @@ async def retry_dead_task(
     }
     
     try:
-        await redis_client.lpush(TRANSFER_QUEUE_KEY, json.dumps(payload))
+        await redis_client.lpush(TRANSFER_QUEUE_KEY, orjson.dumps(payload))
     except redis.RedisError as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -541,7 +668,7 @@ async def list_dead_tasks():
         dead_tasks = await redis_client.lrange(DEAD_QUEUE_KEY, 0, -1)
         return {
             "count": len(dead_tasks),
-            "tasks": [json.loads(task) for task in dead_tasks]
+            "tasks": [orjson.loads(task) for task in dead_tasks]
         }
     except redis.RedisError as exc:
         raise HTTPException(
@@ -576,14 +703,16 @@ async def update_cookie(request: dict):
 
 
 @task_router.get("/cookie/validate")
-async def validate_cookie():
+async def validate_cookie(request: Request):
     cookie = os.getenv("QUARK_COOKIE", "")
     if not cookie:
         return {"valid": False, "message": "Cookie is empty"}
     
     try:
-        from app.services.share_parser import QuarkShareParser
-        async with QuarkShareParser(cookie=cookie) as parser:
+        async with QuarkShareParser(
+            cookie=cookie,
+            client=request.app.state.share_client,
+        ) as parser:
             await parser._fetch_share_token("test", "")
         return {"valid": True, "message": "Cookie is valid"}
     except Exception as exc:
@@ -604,21 +733,29 @@ async def get_task_status(
     return _build_task_record(media, media.original_fid)
 
 
-async def _run_resource_search(request: Request, keyword: str) -> ResourceSearchResponse:
+async def _run_resource_search(
+    request: Request, response: Response, keyword: str
+) -> Union[ResourceSearchResponse, Response]:
     channel_id = _get_query_param(request, "channelId", "channel_id")
     last_message_id = _get_query_param(request, "lastMessageId", "last_message_id")
-    results = await searcher.search_all(keyword, channel_id, last_message_id)
-    return ResourceSearchResponse(data=results)
+    results = await get_searcher().search_all(keyword, channel_id, last_message_id)
+    # Repeat searches are served from the searcher's page cache; let clients
+    # revalidate them instead of downloading the same result list again.
+    payload = ResourceSearchResponse(data=results)
+    not_modified = _check_not_modified(request, response, payload.model_dump())
+    if not_modified:
+        return not_modified
+    return payload
 
 
 @resources_router.get("/search", response_model=ResourceSearchResponse)
-async def search_resources(request: Request, keyword: str = "") -> ResourceSearchResponse:
-    return await _run_resource_search(request, keyword)
+async def search_resources(request: Request, response: Response, keyword: str = ""):
+    return await _run_resource_search(request, response, keyword)
 
 
 @legacy_resources_router.get("/search", response_model=ResourceSearchResponse)
-async def search_resources_legacy(request: Request, keyword: str = "") -> ResourceSearchResponse:
-    return await _run_resource_search(request, keyword)
+async def search_resources_legacy(request: Request, response: Response, keyword: str = ""):
+    return await _run_resource_search(request, response, keyword)
 
 
 @resources_router.get("/channels", response_model=List[ChannelInfo])
@@ -1,13 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routes import router
+from app.api.routes import redis_client, router
 from app.core.db import init_db
-from app.services.telegram_searcher import searcher
+from app.services.share_parser import create_share_client
+from app.services.telegram_searcher import get_searcher
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Quark Media Core Backend", version="0.1.0")
+    app = FastAPI(
+        title="Quark Media Core Backend",
+        version="0.1.0",
+    )
 
     app.add_middleware(
         CORSMiddleware,
@@ -22,10 +26,14 @@ def create_app() -> FastAPI:
     @app.on_event("startup")
     async def on_startup() -> None:
         await init_db()
+        app.state.share_client = create_share_client()
 
     @app.on_event("shutdown")
     async def on_shutdown() -> None:
-        await searcher.close()
+        await app.state.share_client.aclose()
+        if get_searcher.cache_info().currsize:
+            await get_searcher().close()
+        await redis_client.aclose()
 
     return app
 
@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -13,8 +14,15 @@ class TaskStatus(str, Enum):
 
 
 class VirtualMedia(SQLModel, table=True):
+    __table_args__ = (
+        # Latest-per-tmdb_id lookups (home feed, media detail) and the
+        # global "most recently updated" ordering.
+        Index("ix_virtualmedia_tmdb_id_updated_at", "tmdb_id", "updated_at"),
+        Index("ix_virtualmedia_updated_at", "updated_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    tmdb_id: int = Field(index=True)
+    tmdb_id: int
     title: str
     share_url: str
     original_fid: str
@@ -8,6 +8,7 @@ recursive traversal, and retry logic for network robustness.
 
 from __future__ import annotations
 
+import asyncio
 import time
 import re
 from dataclasses import dataclass
@@ -15,7 +16,18 @@ from typing import Dict, List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import httpx
-from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+import orjson
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+try:  # h2 lets concurrent list requests share one multiplexed connection
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:  # pragma: no cover - h2 is optional
+    _HTTP2 = False
+
+
+_SHARE_CODE_RE = re.compile(r"/s/([A-Za-z0-9]+)")
+_RAW_SHARE_CODE_RE = re.compile(r"[A-Za-z0-9]+")
 
 
 class QuarkShareError(Exception):
@@ -34,7 +46,7 @@ class QuarkShareNetworkError(QuarkShareError):
     """Raised for transient network errors."""
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ShareContext:
     """Resolved share context for subsequent list calls."""
     share_code: str
@@ -42,6 +54,36 @@ class ShareContext:
     stoken: str
 
 
+def _default_headers() -> Dict[str, str]:
+    """Headers mirroring the Quark web client."""
+    return {
+        "accept": "application/json, text/plain, */*",
+        "accept-language": "zh-CN,zh;q=0.9,en;q=0.8",
+        "content-type": "application/json",
+        "origin": "https://pan.quark.cn",
+        "referer": "https://pan.quark.cn/",
+        "user-agent": (
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/120.0.0.0 Safari/537.36"
+        ),
+    }
+
+
+def create_share_client(timeout: float = 30.0) -> httpx.AsyncClient:
+    """
+    Build an HTTP client suitable for sharing across QuarkShareParser instances.
+
+    The client carries no cookie; each parser sends its own per request.
+    """
+    return httpx.AsyncClient(
+        timeout=timeout,
+        headers=_default_headers(),
+        http2=_HTTP2,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
+
+
 class QuarkShareParser:
     """
     Parser that resolves a Quark share URL into a full file tree.
@@ -49,6 +91,9 @@ class QuarkShareParser:
     Usage:
         parser = QuarkShareParser(cookie="...")
         files = await parser.parse_share_link("https://pan.quark.cn/s/xxxxx?pwd=abcd")
+
+    Pass ``client`` (see ``create_share_client``) to reuse pooled connections
+    across parsers; a shared client is left open by ``close``.
     """
 
     def __init__(
@@ -58,12 +103,21 @@ class QuarkShareParser:
         max_retries: int = 3,
         page_size: int = 200,
         cookie: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        page_concurrency: int = 4,
+        max_concurrency: int = 8,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.max_retries = max_retries
         self.page_size = max(1, min(page_size, 200))
-        self._client = httpx.AsyncClient(timeout=self.timeout, headers=self._default_headers())
+        self.page_concurrency = max(1, page_concurrency)
+        self.max_concurrency = max(1, max_concurrency)
+        self._owns_client = client is None
+        self._client = client or httpx.AsyncClient(
+            timeout=self.timeout, headers=_default_headers(), http2=_HTTP2
+        )
+        self._headers: Dict[str, str] = {}
         if cookie:
             self.set_cookie(cookie)
 
@@ -74,12 +128,13 @@ class QuarkShareParser:
         await self.close()
 
     async def close(self) -> None:
-        """Close the internal HTTP client."""
-        await self._client.aclose()
+        """Close the internal HTTP client unless it was provided by the caller."""
+        if self._owns_client:
+            await self._client.aclose()
 
     def set_cookie(self, cookie: str) -> None:
         """Set or update the Cookie header for authenticated requests."""
-        self._client.headers["cookie"] = cookie
+        self._headers["cookie"] = cookie
 
     async def parse_share_link(self, share_url: str) -> List[Dict]:
         """
@@ -91,24 +146,9 @@ class QuarkShareParser:
         stoken = await self._fetch_share_token(share_code, passcode)
         context = ShareContext(share_code=share_code, passcode=passcode, stoken=stoken)
 
-        results: List[Dict] = []
-        await self._walk_share_tree(context, results)
-        return results
-
-    def _default_headers(self) -> Dict[str, str]:
-        """Headers mirroring the Quark web client."""
-        return {
-            "accept": "application/json, text/plain, */*",
-            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "content-type": "application/json",
-            "origin": "https://pan.quark.cn",
-            "referer": "https://pan.quark.cn/",
-            "user-agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            ),
-        }
+        nodes: List[Dict] = []
+        await self._walk_share_tree(context, nodes)
+        return nodes
 
     def _extract_share_info(self, share_url: str) -> Tuple[str, str]:
         """
@@ -123,11 +163,18 @@ class QuarkShareParser:
             raise QuarkShareError("share_url is empty")
 
         # Raw share code fallback.
-        if "://" not in share_url and "/" not in share_url:
+        if "/" not in share_url:
+            if not _RAW_SHARE_CODE_RE.fullmatch(share_url):
+                raise QuarkShareError(f"Invalid share code: {share_url}")
             return share_url, ""
 
+        # Reject malformed and non-Quark links here rather than spending a
+        # token request on them.
         parsed = urlparse(share_url)
-        match = re.search(r"/s/([A-Za-z0-9]+)", parsed.path)
+        host = parsed.hostname or ""
+        if host and host != "quark.cn" and not host.endswith(".quark.cn"):
+            raise QuarkShareError(f"Not a Quark share link: {share_url}")
+        match = _SHARE_CODE_RE.search(parsed.path)
         if not match:
             raise QuarkShareError(f"Unable to parse share code from: {share_url}")
 
@@ -167,36 +214,99 @@ class QuarkShareParser:
     async def _walk_share_tree(self, context: ShareContext, results: List[Dict]) -> None:
         """
         Depth-first traversal over the share file tree.
+
+        ``max_concurrency`` workers pull directories from a queue, so a share
+        with thousands of folders never holds more than that many listings
+        open, and a single limiter caps the list requests of this parse. Nodes
+        come out in the same order as a sequential stack-based walk.
         """
-        stack: List[Tuple[str, str]] = [("0", "/")]
+        limiter = asyncio.Semaphore(self.max_concurrency)
+        queue: asyncio.Queue[Tuple[str, str]] = asyncio.Queue()
+        children: Dict[str, List[Dict]] = {}
+        errors: List[BaseException] = []
+
+        async def worker() -> None:
+            while True:
+                pdir_fid, parent_path = await queue.get()
+                try:
+                    if errors:
+                        continue
+                    nodes: List[Dict] = []
+                    async for items in self._iter_share_list(context, pdir_fid, limiter):
+                        for item in items:
+                            nodes.append(self._build_node(item, pdir_fid, parent_path))
+                    children[pdir_fid] = nodes
+                    for node in nodes:
+                        if node["is_dir"]:
+                            queue.put_nowait((node["fid"], node["path"]))
+                except Exception as exc:
+                    errors.append(exc)
+                finally:
+                    queue.task_done()
+
+        queue.put_nowait(("0", "/"))
+        workers = [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        if errors:
+            raise errors[0]
+
+        stack = ["0"]
         while stack:
-            pdir_fid, parent_path = stack.pop()
-            async for items in self._iter_share_list(context, pdir_fid):
-                for item in items:
-                    node = self._build_node(item, pdir_fid, parent_path)
-                    results.append(node)
-
-                    if node["is_dir"]:
-                        stack.append((node["fid"], node["path"]))
+            nodes = children.pop(stack.pop(), [])
+            results.extend(nodes)
+            stack.extend(node["fid"] for node in nodes if node["is_dir"])
 
-    async def _iter_share_list(self, context: ShareContext, pdir_fid: str):
+    async def _iter_share_list(
+        self,
+        context: ShareContext,
+        pdir_fid: str,
+        limiter: asyncio.Semaphore,
+    ):
         """
         Async generator that yields pages of items for a given directory.
+
+        Once the first page reports a total, the remaining pages are fetched
+        in batches of ``page_concurrency`` and yielded in page order. Every
+        request waits on ``limiter``.
         """
-        page = 1
         size = self.page_size
-        while True:
-            items, total = await self._list_share_dir(context, pdir_fid, page, size)
-            if not items:
-                break
-            yield items
-
-            if total is not None:
-                if page * size >= total:
-                    break
-            elif len(items) < size:
-                break
-            page += 1
+
+        async def fetch(page: int) -> Tuple[List[Dict], Optional[int]]:
+            async with limiter:
+                return await self._list_share_dir(context, pdir_fid, page, size)
+
+        items, total = await fetch(1)
+        if not items:
+            return
+        yield items
+
+        if total is None:
+            page = 1
+            while len(items) >= size:
+                page += 1
+                items, _ = await fetch(page)
+                if not items:
+                    return
+                yield items
+            return
+
+        last_page = -(-total // size)
+        for start in range(2, last_page + 1, self.page_concurrency):
+            pages = await asyncio.gather(
+                *(
+                    fetch(page)
+                    for page in range(start, min(start + self.page_concurrency, last_page + 1))
+                )
+            )
+            for items, _ in pages:
+                if not items:
+                    return
+                yield items
 
     async def _list_share_dir(
         self,
@@ -236,21 +346,20 @@ class QuarkShareParser:
 
     def _build_node(self, item: Dict, parent_fid: str, parent_path: str) -> Dict:
         """
-        Normalize an item into a standard JSON node structure.
+        Normalize an item into the JSON node structure returned by the parser.
         """
-        fid = item.get("fid") or ""
-        name = item.get("file_name") or ""
-        is_dir = bool(item.get("dir")) or item.get("file_type") == 0
-        path = self._join_path(parent_path, name)
+        get = item.get
+        name = get("file_name") or ""
+        file_type = get("file_type")
         return {
-            "fid": fid,
+            "fid": get("fid") or "",
             "name": name,
-            "is_dir": is_dir,
+            "is_dir": bool(get("dir")) or file_type == 0,
             "parent_fid": parent_fid,
-            "path": path,
-            "size": item.get("size"),
-            "file_type": item.get("file_type"),
-            "share_fid_token": item.get("share_fid_token"),
+            "path": f"/{name}" if parent_path == "/" else f"{parent_path}/{name}",
+            "size": get("size"),
+            "file_type": file_type,
+            "share_fid_token": get("share_fid_token"),
         }
 
     def _extract_total(self, data: Dict, payload: Dict) -> Optional[int]:
@@ -263,15 +372,9 @@ class QuarkShareParser:
                     return container[key]
         return None
 
-    def _join_path(self, parent_path: str, name: str) -> str:
-        """Join parent and child into a normalized Unix-style path."""
-        if parent_path == "/":
-            return f"/{name}"
-        return f"{parent_path}/{name}"
-
     def _now_ms(self) -> int:
         """Current timestamp in milliseconds."""
-        return int(time.time() * 1000)
+        return time.time_ns() // 1_000_000
 
     async def _request(self, method: str, endpoint: str, **kwargs) -> Dict:
         """
@@ -280,7 +383,7 @@ class QuarkShareParser:
         url = f"{self.base_url}{endpoint}"
         retrying = AsyncRetrying(
             stop=stop_after_attempt(self.max_retries),
-            wait=wait_exponential(multiplier=1, min=1, max=8),
+            wait=wait_random_exponential(multiplier=1, min=1, max=8),
             retry=retry_if_exception_type(QuarkShareNetworkError),
             reraise=True,
         )
@@ -288,9 +391,11 @@ class QuarkShareParser:
         async for attempt in retrying:
             with attempt:
                 try:
-                    response = await self._client.request(method, url, **kwargs)
+                    response = await self._client.request(
+                        method, url, headers=self._headers, **kwargs
+                    )
                     response.raise_for_status()
-                    return response.json()
+                    return orjson.loads(response.content)
                 except httpx.HTTPStatusError as exc:
                     # 4xx/5xx from API; treat as non-retry unless network-related.
                     raise QuarkShareError(
@@ -298,6 +403,6 @@ class QuarkShareParser:
                     ) from exc
                 except (httpx.TimeoutException, httpx.TransportError) as exc:
                     raise QuarkShareNetworkError(str(exc)) from exc
-                except ValueError as exc:
+                except orjson.JSONDecodeError as exc:
                     # JSON decode error or unexpected response format.
                     raise QuarkShareError("Invalid JSON response") from exc
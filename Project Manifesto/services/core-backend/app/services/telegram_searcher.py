@@ -3,16 +3,23 @@ import json
 import logging
 import os
 import re
+import time
+from bisect import bisect_right
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import httpx
+import soupsieve
 from bs4 import BeautifulSoup
 
 
 logger = logging.getLogger("telegram_searcher")
 
+PageKey = Tuple[str, str, str]
+PageResult = Tuple[List[Dict[str, Any]], str]
+
 
 CLOUD_PATTERNS = {
     "baiduPan": re.compile(r"https?://(?:pan|yun)\.baidu\.com/[^\s<>\"]+"),
@@ -24,19 +31,45 @@ CLOUD_PATTERNS = {
     "yidong": re.compile(r"https?://caiyun\.139\.com/[^\s<>\"]+"),
 }
 ALLOWED_CLOUD_TYPES = {"quark"}
+_ACTIVE_CLOUD_PATTERNS = tuple(
+    (name, pattern) for name, pattern in CLOUD_PATTERNS.items() if name in ALLOWED_CLOUD_TYPES
+)
+
+_PHOTO_URL_RE = re.compile(r"url\('(.+?)'\)")
+
+_SEL_HEADER_IMG = soupsieve.compile(".tgme_header_link img")
+_SEL_PAGE_PHOTO = soupsieve.compile(".tgme_page_photo_image img")
+_SEL_MESSAGE_WRAP = soupsieve.compile(".tgme_widget_message_wrap")
+_SEL_MESSAGE = soupsieve.compile(".tgme_widget_message")
+_SEL_MESSAGE_TEXT = soupsieve.compile(".js-message_text, .tgme_widget_message_text")
+_SEL_TIME = soupsieve.compile("time")
+_SEL_PHOTO = soupsieve.compile(".tgme_widget_message_photo_wrap")
+_SEL_ANCHOR = soupsieve.compile("a")
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TeleChannel:
     id: str
     name: str
 
 
+def _fragment_text(fragment: str, separator: str = "") -> str:
+    # Most titles are plain text; skip building a soup when there is no
+    # markup or entity to resolve.
+    if "<" not in fragment and "&" not in fragment:
+        return fragment.strip()
+    soup = BeautifulSoup(fragment, "html.parser")
+    if separator:
+        return soup.get_text(separator, strip=True)
+    return soup.get_text().strip()
+
+
 def _get_app_root() -> Path:
     return Path(__file__).resolve().parents[1]
 
 
-def _load_channels() -> List[TeleChannel]:
+@lru_cache(maxsize=1)
+def _load_channels() -> Tuple[TeleChannel, ...]:
     channels_raw: Optional[Iterable[Dict[str, Any]]] = None
     env_channels = os.getenv("TELE_CHANNELS", "").strip()
     if env_channels:
@@ -60,7 +93,7 @@ def _load_channels() -> List[TeleChannel]:
                 logger.warning("failed to load channels from %s", candidate)
 
     if not channels_raw:
-        return []
+        return ()
 
     channels: List[TeleChannel] = []
     for item in channels_raw:
@@ -70,27 +103,115 @@ def _load_channels() -> List[TeleChannel]:
         name = (item.get("name") or "").strip()
         if channel_id and name:
             channels.append(TeleChannel(id=channel_id, name=name))
-    return channels
+    return tuple(channels)
 
 
 def get_channels() -> List[Dict[str, str]]:
     return [{"id": channel.id, "name": channel.name} for channel in _load_channels()]
 
 
-def _extract_cloud_links(text: str) -> Tuple[List[str], str]:
-    links: List[str] = []
-    cloud_type = ""
-    for name, pattern in CLOUD_PATTERNS.items():
-        matches = pattern.findall(text)
-        if not matches:
+def _extract_cloud_links_batch(texts: List[str]) -> List[Tuple[List[str], str]]:
+    # Scan every message of a page in one pass per pattern. Messages are joined
+    # with newlines, which no cloud pattern can match across, and match offsets
+    # are mapped back to their message through the start offsets.
+    starts: List[int] = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + 1
+    buffer = "\n".join(texts)
+
+    links: List[List[str]] = [[] for _ in texts]
+    cloud_types: List[str] = [""] * len(texts)
+    for name, pattern in _ACTIVE_CLOUD_PATTERNS:
+        for match in pattern.finditer(buffer):
+            index = bisect_right(starts, match.start()) - 1
+            links[index].append(match.group(0))
+            if not cloud_types[index]:
+                cloud_types[index] = name
+    return [
+        (list(dict.fromkeys(message_links)), cloud_type)
+        for message_links, cloud_type in zip(links, cloud_types)
+    ]
+
+
+def _parse_channel_page(html: str) -> PageResult:
+    soup = BeautifulSoup(html, "html.parser")
+    channel_logo = ""
+    header_img = _SEL_HEADER_IMG.select_one(soup)
+    if header_img and header_img.get("src"):
+        channel_logo = header_img["src"]
+    else:
+        page_photo = _SEL_PAGE_PHOTO.select_one(soup)
+        if page_photo and page_photo.get("src"):
+            channel_logo = page_photo["src"]
+
+    # Links are extracted for the whole page first; search_all only keeps
+    # messages with a cloud link, so the rest skip title/content cleanup.
+    wraps: List[Tuple[Any, Any, List[str]]] = []
+    hrefs: List[str] = []
+    for wrap in _SEL_MESSAGE_WRAP.select(soup):
+        text_el = _SEL_MESSAGE_TEXT.select_one(wrap)
+        tags: List[str] = []
+        links: List[str] = []
+        if text_el:
+            for anchor in _SEL_ANCHOR.select(text_el):
+                href = anchor.get("href")
+                if href:
+                    links.append(href)
+                text = anchor.get_text(strip=True)
+                if text.startswith("#"):
+                    tags.append(text)
+
+        wraps.append((wrap, text_el, tags))
+        hrefs.append(" ".join(links))
+
+    items: List[Dict[str, Any]] = []
+    for (wrap, text_el, tags), (cloud_links, cloud_type) in zip(
+        wraps, _extract_cloud_links_batch(hrefs)
+    ):
+        if not cloud_links:
             continue
-        if name not in ALLOWED_CLOUD_TYPES:
-            continue
-        links.extend(matches)
-        if not cloud_type:
-            cloud_type = name
-    deduped = list(dict.fromkeys(links))
-    return deduped, cloud_type
+
+        message_el = _SEL_MESSAGE.select_one(wrap)
+        post_id = message_el.get("data-post") if message_el else ""
+        message_id = post_id.split("/", 1)[1] if post_id and "/" in post_id else None
+
+        raw_html = text_el.decode_contents() if text_el else ""
+        title_html = raw_html.split("<br")[0] if raw_html else ""
+        title = _fragment_text(title_html) if title_html else ""
+        content_html = raw_html.replace(title_html, "", 1) if raw_html else ""
+        content_html = content_html.split("<a")[0] if content_html else ""
+        content = _fragment_text(content_html, " ")
+
+        pub_date = None
+        time_el = _SEL_TIME.select_one(wrap)
+        if time_el:
+            pub_date = time_el.get("datetime")
+
+        image = None
+        photo_el = _SEL_PHOTO.select_one(wrap)
+        if photo_el and photo_el.get("style"):
+            match = _PHOTO_URL_RE.search(photo_el["style"])
+            if match:
+                image = match.group(1)
+
+        items.insert(
+            0,
+            {
+                "id": message_id,
+                "messageId": message_id,
+                "title": title,
+                "content": content,
+                "pubDate": pub_date,
+                "image": image,
+                "tags": tags,
+                "cloudLinks": cloud_links,
+                "cloudType": cloud_type,
+            },
+        )
+
+    return items, channel_logo
 
 
 class TelegramSearcher:
@@ -102,11 +223,27 @@ class TelegramSearcher:
     ) -> None:
         self.base_url = base_url or os.getenv("TELEGRAM_BASE_URL", "https://t.me/s")
         self.concurrency = concurrency or int(os.getenv("TELEGRAM_SEARCH_CONCURRENCY", "6"))
-        self.timeout = timeout or float(os.getenv("TELEGRAM_HTTP_TIMEOUT", "20"))
+        self.timeout = timeout or float(os.getenv("TELEGRAM_HTTP_TIMEOUT", "10"))
+        # search_all waits for its slowest channel; cap the connect phase so
+        # one unreachable channel cannot use up the whole budget.
+        self.connect_timeout = min(
+            self.timeout, float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "3"))
+        )
+        self.cache_ttl = float(os.getenv("TELEGRAM_SEARCH_CACHE_TTL", "60"))
+        self.cache_size = int(os.getenv("TELEGRAM_SEARCH_CACHE_SIZE", "512"))
+        self._cache: Dict[PageKey, Tuple[float, PageResult]] = {}
+        self._inflight: Dict[PageKey, "asyncio.Task[PageResult]"] = {}
+        # Shared by every search so concurrent requests together stay within
+        # the configured number of in-flight page fetches.
+        self._semaphore = asyncio.Semaphore(max(1, self.concurrency))
         self._client = httpx.AsyncClient(
             base_url=self.base_url,
-            timeout=self.timeout,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
             follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max(1, self.concurrency),
+                max_keepalive_connections=max(1, self.concurrency),
+            ),
             headers={
                 "accept": (
                     "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8"
@@ -130,21 +267,26 @@ class TelegramSearcher:
         channel_id: Optional[str] = None,
         last_message_id: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        channels = _load_channels()
+        channels: Iterable[TeleChannel] = _load_channels()
         if channel_id:
             channels = [ch for ch in channels if ch.id == channel_id]
 
-        semaphore = asyncio.Semaphore(max(1, self.concurrency))
         results: List[Dict[str, Any]] = []
 
         async def run_search(channel: TeleChannel) -> None:
-            async with semaphore:
+            async with self._semaphore:
                 try:
+                    started = time.monotonic()
                     items, channel_logo = await self.search_in_web(
                         channel_id=channel.id,
                         keyword=keyword,
                         last_message_id=last_message_id,
                     )
+                    logger.debug(
+                        "searched channel %s in %.0f ms",
+                        channel.id,
+                        (time.monotonic() - started) * 1000,
+                    )
                     if not items:
                         return
                     channel_items = [
@@ -180,7 +322,44 @@ class TelegramSearcher:
         channel_id: str,
         keyword: str,
         last_message_id: Optional[str] = None,
-    ) -> Tuple[List[Dict[str, Any]], str]:
+    ) -> PageResult:
+        # Recent pages are served from a short-lived cache, and concurrent
+        # requests for the same page share a single upstream fetch.
+        key = (channel_id, keyword, last_message_id or "")
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                return cached[1]
+            del self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._fetch_channel_page(channel_id, keyword, last_message_id)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._on_page_fetched, key))
+        return await asyncio.shield(task)
+
+    def _on_page_fetched(self, key: PageKey, task: "asyncio.Task[PageResult]") -> None:
+        self._inflight.pop(key, None)
+        if (
+            task.cancelled()
+            or task.exception() is not None
+            or self.cache_ttl <= 0
+            or self.cache_size <= 0
+        ):
+            return
+        while self._cache and len(self._cache) >= self.cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (time.monotonic() + self.cache_ttl, task.result())
+
+    async def _fetch_channel_page(
+        self,
+        channel_id: str,
+        keyword: str,
+        last_message_id: Optional[str] = None,
+    ) -> PageResult:
         params: Dict[str, str] = {}
         if keyword:
             params["q"] = keyword
@@ -190,70 +369,11 @@ class TelegramSearcher:
         response = await self._client.get(f"/{channel_id}", params=params)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        channel_logo = ""
-        header_img = soup.select_one(".tgme_header_link img")
-        if header_img and header_img.get("src"):
-            channel_logo = header_img["src"]
-        else:
-            page_photo = soup.select_one(".tgme_page_photo_image img")
-            if page_photo and page_photo.get("src"):
-                channel_logo = page_photo["src"]
-
-        items: List[Dict[str, Any]] = []
-        for wrap in soup.select(".tgme_widget_message_wrap"):
-            message_el = wrap.select_one(".tgme_widget_message")
-            post_id = message_el.get("data-post") if message_el else ""
-            message_id = post_id.split("/", 1)[1] if post_id and "/" in post_id else None
-
-            text_el = wrap.select_one(".js-message_text") or wrap.select_one(".tgme_widget_message_text")
-            raw_html = text_el.decode_contents() if text_el else ""
-            title_html = raw_html.split("<br")[0] if raw_html else ""
-            title = BeautifulSoup(title_html, "html.parser").get_text().strip() if title_html else ""
-            content_html = raw_html.replace(title_html, "", 1) if raw_html else ""
-            content_html = content_html.split("<a")[0] if content_html else ""
-            content = BeautifulSoup(content_html, "html.parser").get_text(" ", strip=True)
-
-            pub_date = None
-            time_el = wrap.select_one("time")
-            if time_el:
-                pub_date = time_el.get("datetime")
-
-            image = None
-            photo_el = wrap.select_one(".tgme_widget_message_photo_wrap")
-            if photo_el and photo_el.get("style"):
-                match = re.search(r"url\\('(.+?)'\\)", photo_el["style"])
-                if match:
-                    image = match.group(1)
-
-            tags: List[str] = []
-            links: List[str] = []
-            if text_el:
-                for anchor in text_el.select("a"):
-                    href = anchor.get("href")
-                    if href:
-                        links.append(href)
-                    text = anchor.get_text(strip=True)
-                    if text.startswith("#"):
-                        tags.append(text)
-
-            cloud_links, cloud_type = _extract_cloud_links(" ".join(links))
-            items.insert(
-                0,
-                {
-                    "id": message_id,
-                    "messageId": message_id,
-                    "title": title,
-                    "content": content,
-                    "pubDate": pub_date,
-                    "image": image,
-                    "cloudLinks": cloud_links,
-                    "cloudType": cloud_type,
-                    "tags": tags,
-                },
-            )
-
-        return items, channel_logo
+        # Parsing a full page with BeautifulSoup is CPU-bound; keep it off
+        # the event loop so concurrent channel fetches keep progressing.
+        return await asyncio.to_thread(_parse_channel_page, response.text)
 
 
-searcher = TelegramSearcher()
+@lru_cache(maxsize=1)
+def get_searcher() -> TelegramSearcher:
+    return TelegramSearcher()
@@ -1,7 +1,16 @@
+import asyncio
+import heapq
 import re
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from difflib import SequenceMatcher
+from functools import lru_cache
+from operator import itemgetter
+
+try:
+    from rapidfuzz import fuzz as _fuzz, process as _fuzz_process
+except ImportError:  # pragma: no cover - rapidfuzz is optional
+    _fuzz = _fuzz_process = None
 
 from .ai_interface import (
     AIClassifier,
@@ -16,49 +25,105 @@ from .ai_interface import (
 
 logger = logging.getLogger(__name__)
 
+_YEAR_RE = re.compile(r'\b(19|20)\d{2}\b')
+# Runs of CJK or Latin letters; one scan counts both scripts.
+_SCRIPT_RUN_RE = re.compile(r'(?P<zh>[\u4e00-\u9fff]+)|(?P<en>[a-zA-Z]+)')
+_DUPLICATE_INLINE_LIMIT = 256
+
+
+def _compile_keyword_groups(patterns: Dict[str, str]) -> "re.Pattern[str]":
+    # One named group per keyword (k0, k1, ...) so a single finditer pass
+    # reports every keyword present in the text.
+    return re.compile(
+        "|".join(f"(?P<k{index}>{pattern})" for index, pattern in enumerate(patterns.values())),
+        re.IGNORECASE,
+    )
+
+
+def _matched_keywords(
+    pattern: "re.Pattern[str]",
+    names: Tuple[str, ...],
+    text: str,
+    limit: Optional[int] = None
+) -> List[str]:
+    found = {int(match.lastgroup[1:]) for match in pattern.finditer(text)}
+    # Only the first ``limit`` keywords (in declaration order) are wanted.
+    order = sorted(found) if limit is None else heapq.nsmallest(limit, found)
+    return [names[index] for index in order]
+
+
+# Rule tables are fixed, so they are compiled once at import instead of per
+# classifier instance.
+_CATEGORY_PATTERNS = {
+    MediaCategory.MOVIES: [
+        r'\b(movie|film|电影|影片)\b',
+        r'\b\d{4}\s*\(.*\)',  # Year (Country) format
+        r'\b(1080p|720p|4K|BluRay|WEB-DL)\b'
+    ],
+    MediaCategory.SERIES: [
+        r'\b(S\d+E\d+|Season\s*\d+|Episode\s*\d+|第\d+季|第\d+集)\b',
+        r'\b(TV|Series|剧集|连续剧)\b',
+        r'\b(Complete|全集|完结)\b'
+    ],
+    MediaCategory.DOCUMENTARIES: [
+        r'\b(documentary|纪录片)\b',
+        r'\b(National Geographic|Discovery|BBC)\b',
+        r'\b(探索|纪实)\b'
+    ],
+    MediaCategory.ANIME: [
+        r'\b(anime|animation|动漫|动画)\b',
+        r'\b(番剧|日漫)\b',
+        r'\b(ova|oad|ova)\b'
+    ],
+    MediaCategory.MUSIC: [
+        r'\b(music|song|album|音乐|歌曲|专辑)\b',
+        r'\.(mp3|flac|wav|aac|m4a)$',
+        r'\b(soundtrack|ost|原声)\b'
+    ]
+}
+
+_GENRE_PATTERNS = {
+    'Action': r'\b(action|动作)\b',
+    'Comedy': r'\b(comedy|喜剧)\b',
+    'Drama': r'\b(drama|剧情)\b',
+    'Horror': r'\b(horror|恐怖)\b',
+    'Sci-Fi': r'\b(scifi|sci-fi|科幻)\b',
+    'Thriller': r'\b(thriller|惊悚)\b',
+    'Romance': r'\b(romance|爱情)\b',
+    'Adventure': r'\b(adventure|冒险)\b',
+    'Fantasy': r'\b(fantasy|奇幻)\b',
+    'Crime': r'\b(crime|犯罪)\b'
+}
+
+_TAG_PATTERNS = {
+    **_GENRE_PATTERNS,
+    'HD': r'\b(1080p|720p|4k|hd)\b',
+    'Subtitles': r'\b(sub|subtitle|字幕)\b',
+    'Dual Audio': r'\b(dual|双语)\b',
+    'Complete': r'\b(complete|全集|完结)\b'
+}
+
+_CATEGORY_RES = {
+    category: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for category, patterns in _CATEGORY_PATTERNS.items()
+}
+_GENRE_NAMES = tuple(_GENRE_PATTERNS)
+_GENRE_RE = _compile_keyword_groups(_GENRE_PATTERNS)
+_TAG_NAMES = tuple(_TAG_PATTERNS)
+_TAG_RE = _compile_keyword_groups(_TAG_PATTERNS)
+
 
 class RuleBasedClassifier(AIClassifier):
     def __init__(self):
-        self._category_patterns = {
-            MediaCategory.MOVIES: [
-                r'\b(movie|film|电影|影片)\b',
-                r'\b\d{4}\s*\(.*\)',  # Year (Country) format
-                r'\b(1080p|720p|4K|BluRay|WEB-DL)\b'
-            ],
-            MediaCategory.SERIES: [
-                r'\b(S\d+E\d+|Season\s*\d+|Episode\s*\d+|第\d+季|第\d+集)\b',
-                r'\b(TV|Series|剧集|连续剧)\b',
-                r'\b(Complete|全集|完结)\b'
-            ],
-            MediaCategory.DOCUMENTARIES: [
-                r'\b(documentary|纪录片)\b',
-                r'\b(National Geographic|Discovery|BBC)\b',
-                r'\b(探索|纪实)\b'
-            ],
-            MediaCategory.ANIME: [
-                r'\b(anime|animation|动漫|动画)\b',
-                r'\b(番剧|日漫)\b',
-                r'\b(ova|oad|ova)\b'
-            ],
-            MediaCategory.MUSIC: [
-                r'\b(music|song|album|音乐|歌曲|专辑)\b',
-                r'\.(mp3|flac|wav|aac|m4a)$',
-                r'\b(soundtrack|ost|原声)\b'
-            ]
-        }
+        # Scoring is deterministic in the text and the same titles are
+        # classified repeatedly; cache the immutable scores, not the models.
+        self._cached_category_scores = lru_cache(maxsize=4096)(self._category_scores)
 
-        self._genre_patterns = {
-            'Action': r'\b(action|动作)\b',
-            'Comedy': r'\b(comedy|喜剧)\b',
-            'Drama': r'\b(drama|剧情)\b',
-            'Horror': r'\b(horror|恐怖)\b',
-            'Sci-Fi': r'\b(scifi|sci-fi|科幻)\b',
-            'Thriller': r'\b(thriller|惊悚)\b',
-            'Romance': r'\b(romance|爱情)\b',
-            'Adventure': r'\b(adventure|冒险)\b',
-            'Fantasy': r'\b(fantasy|奇幻)\b',
-            'Crime': r'\b(crime|犯罪)\b'
-        }
+    def _category_scores(self, text: str) -> Tuple[Tuple[MediaCategory, int], ...]:
+        return tuple(
+            (category, sum(len(pattern.findall(text)) for pattern in patterns))
+            for category, patterns in _CATEGORY_RES.items()
+        )
 
     async def classify_media(
         self,
@@ -68,20 +133,15 @@ class RuleBasedClassifier(AIClassifier):
     ) -> ClassificationResult:
         text = f"{title} {filename or ''}".lower()
         
-        scores = {}
-        for category, patterns in self._category_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text, re.IGNORECASE))
-                score += matches
-            scores[category] = score
+        category_scores = self._cached_category_scores(text)
+        scores = dict(category_scores)
         
-        max_score = max(scores.values())
+        best_category, max_score = max(category_scores, key=itemgetter(1))
         if max_score == 0:
             category = MediaCategory.OTHERS
             confidence = 0.5
         else:
-            category = max(scores, key=scores.get)
+            category = best_category
             confidence = min(max_score / 3.0, 1.0)
         
         metadata = {
@@ -103,13 +163,10 @@ class RuleBasedClassifier(AIClassifier):
     ) -> MediaMetadata:
         text = f"{title} {filename or ''}"
         
-        year_match = re.search(r'\b(19|20)\d{2}\b', text)
+        year_match = _YEAR_RE.search(text)
         year = int(year_match.group()) if year_match else None
         
-        genres = []
-        for genre, pattern in self._genre_patterns.items():
-            if re.search(pattern, text, re.IGNORECASE):
-                genres.append(genre)
+        genres = _matched_keywords(_GENRE_RE, _GENRE_NAMES, text)
         
         language = self._detect_language(text)
         
@@ -132,24 +189,15 @@ class RuleBasedClassifier(AIClassifier):
     ) -> List[TagSuggestion]:
         text = f"{title} {description or ''}".lower()
         
-        tags = []
-        all_patterns = {
-            **self._genre_patterns,
-            'HD': r'\b(1080p|720p|4k|hd)\b',
-            'Subtitles': r'\b(sub|subtitle|字幕)\b',
-            'Dual Audio': r'\b(dual|双语)\b',
-            'Complete': r'\b(complete|全集|完结)\b'
-        }
-        
-        for tag, pattern in all_patterns.items():
-            if re.search(pattern, text, re.IGNORECASE):
-                tags.append(TagSuggestion(tag=tag, confidence=0.9))
-        
-        return tags[:limit]
+        matched = _matched_keywords(_TAG_RE, _TAG_NAMES, text, max(limit, 0))
+        return [TagSuggestion(tag=tag, confidence=0.9) for tag in matched]
 
     def _detect_language(self, text: str) -> Optional[str]:
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_chars = len(re.findall(r'[a-zA-Z]', text))
+        counts = {"zh": 0, "en": 0}
+        for match in _SCRIPT_RUN_RE.finditer(text):
+            counts[match.lastgroup] += match.end() - match.start()
+        chinese_chars = counts["zh"]
+        english_chars = counts["en"]
         
         if chinese_chars > english_chars:
             return "zh-CN"
@@ -159,6 +207,47 @@ class RuleBasedClassifier(AIClassifier):
             return None
 
 
+def _find_duplicates(
+    title: str,
+    existing_titles: List[str],
+    threshold: float
+) -> List[Dict[str, Any]]:
+    title_lower = title.lower()
+    if _fuzz_process is not None:
+        # Score every candidate in a single C call; results come back
+        # sorted by score with the index of the original title.
+        matches = _fuzz_process.extract(
+            title_lower,
+            [existing_title.lower() for existing_title in existing_titles],
+            scorer=_fuzz.ratio,
+            score_cutoff=threshold * 100,
+            limit=None,
+        )
+        return [
+            {"title": existing_titles[index], "similarity": score / 100.0}
+            for _, score, index in matches
+        ]
+
+    # Repeated candidates are common (the same release listed by several
+    # sources); score each distinct title only once.
+    matcher = SequenceMatcher(None, title_lower)
+    scores: Dict[str, float] = {}
+    duplicates = []
+    for existing_title in existing_titles:
+        candidate = existing_title.lower()
+        similarity = scores.get(candidate)
+        if similarity is None:
+            matcher.set_seq2(candidate)
+            similarity = scores[candidate] = matcher.ratio()
+        if similarity >= threshold:
+            duplicates.append({
+                "title": existing_title,
+                "similarity": similarity
+            })
+    
+    return sorted(duplicates, key=itemgetter("similarity"), reverse=True)
+
+
 class RuleBasedEnhancer(AIEnhancer):
     async def enhance_description(
         self,
@@ -202,17 +291,11 @@ class RuleBasedEnhancer(AIEnhancer):
         existing_titles: List[str],
         threshold: float = 0.85
     ) -> List[Dict[str, Any]]:
-        duplicates = []
-        
-        for existing_title in existing_titles:
-            similarity = SequenceMatcher(None, title.lower(), existing_title.lower()).ratio()
-            if similarity >= threshold:
-                duplicates.append({
-                    "title": existing_title,
-                    "similarity": similarity
-                })
-        
-        return sorted(duplicates, key=lambda x: x["similarity"], reverse=True)
+        # Scoring is CPU-bound; large candidate lists are scored on a worker
+        # thread so the event loop keeps serving other tasks meanwhile.
+        if len(existing_titles) > _DUPLICATE_INLINE_LIMIT:
+            return await asyncio.to_thread(_find_duplicates, title, existing_titles, threshold)
+        return _find_duplicates(title, existing_titles, threshold)
 
 
 class AIServiceAdapter(AIService):
@@ -231,7 +314,7 @@ class AIServiceAdapter(AIService):
             logger.info("AI服务初始化成功")
             return True
         except Exception as e:
-            logger.error(f"AI服务初始化失败: {e}")
+            logger.error("AI服务初始化失败: %s", e)
             return False
 
     async def health_check(self) -> bool:
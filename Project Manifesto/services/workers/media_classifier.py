@@ -1,12 +1,23 @@
 import logging
 import os
 import re
-from typing import Optional
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
 from urllib.parse import quote
 
 
 logger = logging.getLogger("media_classifier")
 
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+# Applied one bracket kind at a time, in this order: with interleaved
+# brackets such as "(a[b)c]" a single alternation would strip different text.
+_BRACKETED_RES = tuple(
+    re.compile(pattern) for pattern in (r"\[.*?\]", r"\(.*?\)", r"\{.*?\}", r"【.*?】", r"<.*?>")
+)
+_ILLEGAL_CHARS = str.maketrans(dict.fromkeys('\\/:*?"<>|', "_"))
+
 
 class MediaType:
     MOVIES = "Movies"
@@ -17,67 +28,75 @@ class MediaType:
     OTHERS = "Others"
 
 
+# Categories in priority order; one named group each so a single scan finds
+# every category present in the text. The groups sit inside a zero-width
+# lookahead so a match never consumes text that overlaps a keyword of another
+# category (e.g. "music" inside "musicartoon" must not hide "cartoon").
+_CATEGORY_PATTERNS = (
+    (MediaType.DOCUMENTARIES, r"纪录片|documentary|docu"),
+    (MediaType.ANIME, r"动漫|anime|动画|cartoon|番剧"),
+    (MediaType.SERIES, r"s\d+e\d+|第\d+集|ep\d+|season\s*\d+"),
+    (MediaType.MUSIC, r"音乐|music|歌曲|album|soundtrack"),
+)
+_CATEGORY_RE = re.compile(
+    "(?="
+    + "|".join(f"(?P<{media_type}>{pattern})" for media_type, pattern in _CATEGORY_PATTERNS)
+    + ")",
+    re.IGNORECASE,
+)
+_CATEGORY_PRIORITY = tuple(media_type for media_type, _ in _CATEGORY_PATTERNS)
+
+
 class MediaClassifier:
     def __init__(self, dest_pattern: Optional[str] = None):
         self.dest_pattern = dest_pattern or os.getenv(
             "TRANSFER_DEST_DIR_PATTERN",
             "/QuarkMedia/{type}/{year}/{title}({year})"
         )
-        self._dir_cache = {}
+        # Directory fids by destination path, least recently used first.
+        # Entries expire so a folder removed on the Quark side is looked up
+        # again instead of being reused forever.
+        self.dir_cache_size = int(os.getenv("TRANSFER_DIR_CACHE_SIZE", "1024"))
+        self.dir_cache_ttl = float(os.getenv("TRANSFER_DIR_CACHE_TTL", "3600"))
+        self._dir_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Classification is a pure function of the text and retried tasks
+        # re-classify the same title/filename, so memoize per instance.
+        self._classify_cached = lru_cache(maxsize=4096)(self._classify)
+        # Episodes of one share carry the same title, so the year lookup and
+        # the quoted clean title are computed once per distinct title.
+        self._title_parts = lru_cache(maxsize=4096)(self._parse_title)
 
     def classify(self, title: str, filename: Optional[str] = None) -> str:
         title = title or ""
         filename = filename or ""
-        combined = f"{title} {filename}".lower()
-        
-        if self._is_documentary(combined):
-            return MediaType.DOCUMENTARIES
-        elif self._is_anime(combined):
-            return MediaType.ANIME
-        elif self._is_series(combined):
-            return MediaType.SERIES
-        elif self._is_music(combined):
-            return MediaType.MUSIC
-        else:
-            return MediaType.MOVIES
-
-    def _is_documentary(self, text: str) -> bool:
-        keywords = ["纪录片", "documentary", "docu"]
-        return any(keyword in text for keyword in keywords)
-
-    def _is_anime(self, text: str) -> bool:
-        keywords = ["动漫", "anime", "动画", "cartoon", "番剧"]
-        return any(keyword in text for keyword in keywords)
-
-    def _is_series(self, text: str) -> bool:
-        patterns = [
-            r".*s\d+e\d+.*",
-            r".*第\d+集.*",
-            r".*ep\d+.*",
-            r".*season\s*\d+.*",
-        ]
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
-
-    def _is_music(self, text: str) -> bool:
-        keywords = ["音乐", "music", "歌曲", "album", "soundtrack"]
-        return any(keyword in text for keyword in keywords)
+        return self._classify_cached(f"{title} {filename}".lower())
+
+    def _classify(self, combined: str) -> str:
+        found = set()
+        for match in _CATEGORY_RE.finditer(combined):
+            if match.lastgroup == _CATEGORY_PRIORITY[0]:
+                return match.lastgroup
+            found.add(match.lastgroup)
+        for media_type in _CATEGORY_PRIORITY:
+            if media_type in found:
+                return media_type
+        return MediaType.MOVIES
 
     def extract_year(self, title: str) -> Optional[int]:
-        year_match = re.search(r"\b(19|20)\d{2}\b", title)
+        year_match = _YEAR_RE.search(title)
         if year_match:
             return int(year_match.group())
         return None
 
     def clean_title(self, title: str) -> str:
-        title = title.strip()
-        title = re.sub(r"\[.*?\]", "", title)
-        title = re.sub(r"\(.*?\)", "", title)
-        title = re.sub(r"\{.*?\}", "", title)
-        title = re.sub(r"【.*?】", "", title)
-        title = re.sub(r"<.*?>", "", title)
-        title = re.sub(r"\s+", " ", title)
-        title = re.sub(r"[\\/:*?\"<>|]", "_", title)
-        return title.strip()
+        for pattern in _BRACKETED_RES:
+            title = pattern.sub("", title)
+        # split()/join collapses whitespace runs and trims both ends in one
+        # pass; the translation never produces whitespace.
+        return " ".join(title.split()).translate(_ILLEGAL_CHARS)
+
+    def _parse_title(self, title: str) -> Tuple[Optional[int], str]:
+        return self.extract_year(title), quote(self.clean_title(title), safe="")
 
     def build_dest_path(
         self,
@@ -87,10 +106,8 @@ class MediaClassifier:
         year: Optional[int] = None,
     ) -> str:
         media_type = media_type or self.classify(title, filename)
-        year = year or self.extract_year(title)
-        clean_title = self.clean_title(title)
-        
-        safe_title = quote(clean_title, safe="")
+        title_year, safe_title = self._title_parts(title)
+        year = year or title_year
         safe_filename = quote(filename, safe="") if filename else ""
         
         path = self.dest_pattern.format(
@@ -103,8 +120,20 @@ class MediaClassifier:
         return path
 
     def get_cached_dir_fid(self, path: str) -> Optional[str]:
-        return self._dir_cache.get(path)
+        entry = self._dir_cache.get(path)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._dir_cache[path]
+            return None
+        self._dir_cache.move_to_end(path)
+        return entry[1]
 
     def cache_dir_fid(self, path: str, fid: str) -> None:
-        self._dir_cache[path] = fid
+        if self.dir_cache_ttl <= 0 or self.dir_cache_size <= 0:
+            return
+        self._dir_cache[path] = (time.monotonic() + self.dir_cache_ttl, fid)
+        self._dir_cache.move_to_end(path)
+        if len(self._dir_cache) > self.dir_cache_size:
+            self._dir_cache.popitem(last=False)
         logger.debug("cached directory fid: %s -> %s", path, fid)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import posixpath
@@ -7,11 +8,44 @@ from typing import Any, Dict, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import orjson
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
 
 
 logger = logging.getLogger("quark_client")
 
+# Literal markers searched in one pass over lower-cased API messages.
+_AUTH_ERROR_RE = re.compile(r"require login|guest")
+_SHARE_CODE_RE = re.compile(r"/s/([A-Za-z0-9_-]+)")
+_QUARK_HOSTS = ("pan.quark.cn", "drive.quark.cn")
+# JSON, JS assignment and escaped-JSON forms of the stoken, in precedence
+# order: a later form is only used when no earlier form appears in the page.
+_STOKEN_HTML_RES = (
+    re.compile(rb'"stoken"\s*:\s*"([^"]+)"'),
+    re.compile(rb"stoken\s*[:=]\s*['\"]([^'\"]+)['\"]"),
+    re.compile(rb'\\"stoken\\"\s*:\s*\\"([^\\"]+)\\"'),
+)
+_RETRY_SHARE_SAVE_RE = re.compile(
+    r"fid_list|share_fid_token_list|fid_token_list|param|missing|required"
+)
+_STOKEN_CACHE_SIZE = 512
+_SHARE_PAGE_MAX_BYTES = 256 * 1024
+# Bytes re-scanned from the previous chunk so a stoken split across two
+# chunks is still matched.
+_STOKEN_SCAN_OVERLAP = 512
+
+
+class _Truncated:
+    """Log argument that shortens a token only when the record is emitted."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Optional[str]) -> None:
+        self.value = value
+
+    def __str__(self) -> str:
+        return f"{self.value[:10]}..." if self.value else "None"
+
 
 class QuarkClientError(Exception):
     pass
@@ -37,6 +71,20 @@ class QuarkClient:
         self.share_base_url = "https://drive-h.quark.cn"
         self._share_safe_host_url: Optional[str] = None
         self.max_retries = max_retries
+        # Minimum spacing between outgoing requests (0 disables throttling).
+        self.min_request_interval = max(0.0, float(os.getenv("QUARK_MIN_REQUEST_INTERVAL", "0")))
+        self._throttle_lock = asyncio.Lock()
+        self._next_request_at = 0.0
+        # Share tokens keyed by (share_code, passcode); 0 disables caching.
+        self.stoken_ttl = max(0.0, float(os.getenv("QUARK_STOKEN_TTL", "600")))
+        self._stoken_cache: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        # Scraping the share page for a stoken is a slow second request that
+        # rarely succeeds where the token API failed; opt-in only.
+        self.stoken_html_fallback = os.getenv("QUARK_STOKEN_HTML_FALLBACK", "0").strip().lower() in (
+            "1",
+            "true",
+            "yes",
+        )
         self.client = httpx.AsyncClient(
             headers={
                 "accept": "application/json, text/plain, */*",
@@ -56,9 +104,27 @@ class QuarkClient:
             limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
         )
 
+    async def __aenter__(self) -> "QuarkClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
     async def close(self) -> None:
         await self.client.aclose()
 
+    async def _throttle(self) -> None:
+        if not self.min_request_interval:
+            return
+        # Reserve the next slot under the lock so concurrent callers queue up
+        # instead of all passing the check at once.
+        async with self._throttle_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.min_request_interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
     async def _get_config(self) -> Dict[str, Any]:
         try:
             url = f"{self.base_url}/1/clouddrive/config"
@@ -69,7 +135,7 @@ class QuarkClient:
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=8),
+        wait=wait_random_exponential(multiplier=1, min=1, max=8),
         retry=retry_if_exception_type((QuarkNetworkError, httpx.TimeoutException)),
         reraise=True
     )
@@ -79,6 +145,14 @@ class QuarkClient:
         logger.info("share_code extracted: %s", share_code)
         logger.info("passcode extracted: %s", passcode)
 
+        key = (share_code, passcode)
+        cached = self._stoken_cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                logger.info("stoken served from cache")
+                return cached[1]
+            del self._stoken_cache[key]
+
         normalized_url = self._normalize_share_url(share_url, share_code, passcode)
         logger.info("share_url normalized: %s", normalized_url)
 
@@ -86,35 +160,53 @@ class QuarkClient:
             logger.info("requesting stoken via share token API")
             stoken = await self._get_share_token(share_code, passcode)
             logger.info("stoken obtained via API")
-            return stoken
+            return self._remember_stoken(key, stoken)
         except QuarkAuthError:
             raise
         except (httpx.TimeoutException, httpx.TransportError) as exc:
             logger.error("share token API network error: %s", exc)
             raise QuarkNetworkError(f"Network error during stoken fetch: {exc}") from exc
         except Exception as exc:
+            if not self.stoken_html_fallback:
+                logger.error("share token API failed: %s", exc)
+                raise QuarkAPIError(f"Failed to get stoken: {exc}") from exc
             logger.exception("share token API failed, falling back to HTML parsing")
 
         try:
-            headers = dict(self.client.headers)
-            self._log_request("GET", normalized_url, headers, None, None)
-            response = await self.client.get(normalized_url)
-            status_code = response.status_code
-            html = response.text
-            logger.info("share page status: %s", status_code)
-            logger.info("share page body: %s", html)
-            response.raise_for_status()
+            self._log_request("GET", normalized_url, None, None, None)
+            await self._throttle()
+            # Read at most _SHARE_PAGE_MAX_BYTES of the page; the JSON stoken
+            # sits in the inline state near the top, so stop at the first
+            # chunk that completes it. The other forms only count when the
+            # JSON form is absent, so they are searched once the read ends.
+            # Matching runs on the raw bytes and only the token is decoded.
+            body = bytearray()
+            match = None
+            async with self.client.stream("GET", normalized_url) as response:
+                status_code = response.status_code
+                logger.info("share page status: %s", status_code)
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    start = max(0, len(body) - _STOKEN_SCAN_OVERLAP)
+                    body += chunk
+                    match = _STOKEN_HTML_RES[0].search(body, start, _SHARE_PAGE_MAX_BYTES)
+                    if match or len(body) >= _SHARE_PAGE_MAX_BYTES:
+                        break
+                encoding = response.encoding or "utf-8"
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "share page body: %s",
+                    body[:_SHARE_PAGE_MAX_BYTES].decode(encoding, errors="ignore"),
+                )
 
-            patterns = [
-                r'"stoken"\s*:\s*"([^"]+)"',
-                r"stoken\s*[:=]\s*['\"]([^'\"]+)['\"]",
-                r'\\"stoken\\"\s*:\s*\\"([^\\"]+)\\"',
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, html)
+            for pattern in _STOKEN_HTML_RES[1:]:
                 if match:
-                    logger.info("stoken found via HTML parsing")
-                    return match.group(1)
+                    break
+                match = pattern.search(body, 0, _SHARE_PAGE_MAX_BYTES)
+            if match:
+                logger.info("stoken found via HTML parsing")
+                stoken = match.group(1).decode(encoding, errors="ignore")
+                return self._remember_stoken(key, stoken)
         except (httpx.TimeoutException, httpx.TransportError) as exc:
             logger.error("HTML parsing network error: %s", exc)
             raise QuarkNetworkError(f"Network error during HTML parsing: {exc}") from exc
@@ -124,9 +216,22 @@ class QuarkClient:
 
         raise QuarkAPIError("stoken not found in share page HTML")
 
+    def invalidate_stoken(self, share_url: Optional[str]) -> None:
+        try:
+            self._stoken_cache.pop(self._extract_share_info(share_url), None)
+        except ValueError:
+            pass
+
+    def _remember_stoken(self, key: Tuple[str, str], stoken: str) -> str:
+        if self.stoken_ttl > 0:
+            if key not in self._stoken_cache and len(self._stoken_cache) >= _STOKEN_CACHE_SIZE:
+                self._stoken_cache.pop(next(iter(self._stoken_cache)))
+            self._stoken_cache[key] = (time.monotonic() + self.stoken_ttl, stoken)
+        return stoken
+
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=8),
+        wait=wait_random_exponential(multiplier=1, min=1, max=8),
         retry=retry_if_exception_type((QuarkNetworkError, httpx.TimeoutException)),
         reraise=True
     )
@@ -156,7 +261,7 @@ class QuarkClient:
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=8),
+        wait=wait_random_exponential(multiplier=1, min=1, max=8),
         retry=retry_if_exception_type((QuarkNetworkError, httpx.TimeoutException)),
         reraise=True
     )
@@ -231,7 +336,7 @@ class QuarkClient:
                         error_msg,
                     )
 
-                    if "require login" in str(error_msg).lower() or "guest" in str(error_msg).lower():
+                    if self._is_auth_error(error_msg):
                         raise QuarkAuthError(f"Authentication failed: {error_msg}")
 
                     if not self._should_retry_share_save(error_msg):
@@ -261,9 +366,19 @@ class QuarkClient:
         if not share_code:
             logger.warning("share_code missing, skip sharepage/save")
             return None
+        use_safe_host = os.getenv("QUARK_SHARE_SAVE_USE_SAFE_HOST", "1").strip().lower() not in (
+            "0",
+            "false",
+            "no",
+        )
         resolved_fid_token = None
         if not file_fid and share_fid_token:
-            file_fid, resolved_fid_token = await self._resolve_share_fid(share_code, stoken, share_fid_token)
+            lookups = [self._resolve_share_fid(share_code, stoken, share_fid_token)]
+            if use_safe_host:
+                # The safe host is cached after its first lookup; resolve it
+                # alongside the fid instead of after it.
+                lookups.append(self._get_share_safe_host_url())
+            (file_fid, resolved_fid_token), *_ = await asyncio.gather(*lookups)
         if not file_fid:
             logger.warning("file fid missing, skip sharepage/save")
             return None
@@ -282,7 +397,7 @@ class QuarkClient:
             payload["share_fid_token_list"] = [share_fid_token]
 
         logger.info("sharepage/save payload: fid=%s, fid_token=%s, share_code=%s, stoken=%s", 
-                   file_fid, resolved_fid_token or share_fid_token, share_code, stoken[:10] + "..." if stoken else "None")
+                   file_fid, resolved_fid_token or share_fid_token, share_code, _Truncated(stoken))
 
         params = {
             **self._base_params(),
@@ -291,19 +406,16 @@ class QuarkClient:
         }
 
         extra_hosts = []
-        use_safe_host = os.getenv("QUARK_SHARE_SAVE_USE_SAFE_HOST", "1").strip().lower() not in (
-            "0",
-            "false",
-            "no",
-        )
         if use_safe_host:
             safe_host = await self._get_share_safe_host_url()
             if safe_host:
                 extra_hosts.append(safe_host)
 
         base_urls = list(self._share_save_base_urls())
+        seen = set(base_urls)
         for host in extra_hosts:
-            if host not in base_urls:
+            if host not in seen:
+                seen.add(host)
                 base_urls.append(host)
 
         for base_url in base_urls:
@@ -327,7 +439,7 @@ class QuarkClient:
                         message = exc.response.text or ""
                     logger.error(
                         "sharepage/save 403 error on base_url=%s: code=%s, message=%s, fid=%s, fid_token=%s",
-                        base_url, error_code, message, file_fid, resolved_fid_token or share_fid_token[:10] + "..." if (resolved_fid_token or share_fid_token) else "None"
+                        base_url, error_code, message, file_fid, _Truncated(resolved_fid_token or share_fid_token)
                     )
                     if error_code == 41020:
                         logger.error("Token validation failed (code 41020): fid and fid_token do not match or token expired")
@@ -348,10 +460,10 @@ class QuarkClient:
             error_code = data.get("code") or ""
             logger.warning(
                 "sharepage/save failed status=%s code=%s message=%s, fid=%s, fid_token=%s",
-                data.get("status"), error_code, error_msg, file_fid, resolved_fid_token or share_fid_token[:10] + "..." if (resolved_fid_token or share_fid_token) else "None"
+                data.get("status"), error_code, error_msg, file_fid, _Truncated(resolved_fid_token or share_fid_token)
             )
 
-            if "require login" in str(error_msg).lower() or "guest" in str(error_msg).lower():
+            if self._is_auth_error(error_msg):
                 raise QuarkAuthError(f"Authentication failed: {error_msg}")
 
             if not self._should_retry_share_save(error_msg):
@@ -361,9 +473,9 @@ class QuarkClient:
 
     def _normalize_share_url(self, share_url: str, share_code: str, passcode: str) -> str:
         share_url = (share_url or "").strip()
-        if share_url.startswith("http://") or share_url.startswith("https://"):
+        if share_url.startswith(("http://", "https://")):
             return share_url
-        if share_url.startswith("pan.quark.cn") or share_url.startswith("drive.quark.cn"):
+        if share_url.startswith(_QUARK_HOSTS):
             return f"https://{share_url}"
         if "/" in share_url:
             return f"https://{share_url}"
@@ -377,14 +489,14 @@ class QuarkClient:
         if not share_url:
             raise ValueError("share_url is empty")
 
-        if "://" not in share_url and "/" not in share_url:
+        if "/" not in share_url:
             return share_url, ""
 
         candidate = share_url
-        if share_url.startswith("pan.quark.cn") or share_url.startswith("drive.quark.cn"):
+        if share_url.startswith(_QUARK_HOSTS):
             candidate = f"https://{share_url}"
 
-        match = re.search(r"/s/([A-Za-z0-9_-]+)", candidate)
+        match = _SHARE_CODE_RE.search(candidate)
         if not match:
             raise ValueError(f"Unable to parse share code from: {share_url}")
 
@@ -452,9 +564,9 @@ class QuarkClient:
             fid = item.get("fid") or item.get("file_id")
             fid_token = item.get("share_fid_token")
             if fid and fid_token:
-                logger.info("resolved fid=%s, fid_token=%s from sharepage/detail", fid, fid_token[:10] + "..." if fid_token else "None")
+                logger.info("resolved fid=%s, fid_token=%s from sharepage/detail", fid, _Truncated(fid_token))
                 return str(fid), fid_token
-        logger.warning("share fid not found in sharepage/detail for share_fid_token=%s", share_fid_token[:10] + "..." if share_fid_token else "None")
+        logger.warning("share fid not found in sharepage/detail for share_fid_token=%s", _Truncated(share_fid_token))
         return None, None
 
     async def _get_share_safe_host_url(self) -> Optional[str]:
@@ -481,36 +593,21 @@ class QuarkClient:
         if extra_hosts:
             candidates.extend(extra_hosts)
         candidates.extend([self.share_base_url, self.base_url])
-        deduped = []
-        for candidate in candidates:
-            if not candidate:
-                continue
-            normalized = candidate.rstrip("/")
-            if normalized in deduped:
-                continue
-            deduped.append(normalized)
-        return tuple(deduped)
+        # dict.fromkeys keeps first-seen order while deduplicating in O(1).
+        return tuple(dict.fromkeys(candidate.rstrip("/") for candidate in candidates if candidate))
 
     def _is_ok_response(self, data: Dict[str, Any]) -> bool:
         status = data.get("status")
         code = data.get("code")
         return status == 200 or code == 0
 
+    def _is_auth_error(self, message: Any) -> bool:
+        return _AUTH_ERROR_RE.search(str(message).lower()) is not None
+
     def _should_retry_share_save(self, error_msg: str) -> bool:
         if not error_msg:
             return False
-        text = str(error_msg).lower()
-        return any(
-            token in text
-            for token in (
-                "fid_list",
-                "share_fid_token_list",
-                "fid_token_list",
-                "param",
-                "missing",
-                "required",
-            )
-        )
+        return _RETRY_SHARE_SAVE_RE.search(str(error_msg).lower()) is not None
 
     async def _find_child_dir(self, parent_fid: str, name: str) -> Optional[str]:
         page = 1
@@ -559,7 +656,7 @@ class QuarkClient:
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=8),
+        wait=wait_random_exponential(multiplier=1, min=1, max=8),
         retry=retry_if_exception_type((QuarkNetworkError, httpx.TimeoutException)),
         reraise=True
     )
@@ -575,7 +672,7 @@ class QuarkClient:
             data = await self._request_json("POST", url, params=self._base_params(), payload=payload)
             if data.get("status") != 200:
                 message = data.get("message") or data.get("error") or "create folder failed"
-                if "require login" in str(message).lower() or "guest" in str(message).lower():
+                if self._is_auth_error(message):
                     raise QuarkAuthError(f"Authentication failed: {message}")
                 raise QuarkAPIError(f"Create directory failed: {message}")
             folder = data.get("data") or {}
@@ -601,23 +698,21 @@ class QuarkClient:
         payload: Optional[Dict[str, Any]] = None,
         headers: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
-        merged_headers = dict(self.client.headers)
-        if headers:
-            merged_headers.update(headers)
-        self._log_request(method, url, merged_headers, params, payload)
+        self._log_request(method, url, headers, params, payload)
 
         try:
+            await self._throttle()
             response = await self.client.request(
                 method,
                 url,
                 params=params,
                 json=payload,
-                headers=merged_headers,
+                headers=headers,
             )
             status_code = response.status_code
             try:
-                data = response.json()
-            except Exception:
+                data = orjson.loads(response.content)
+            except orjson.JSONDecodeError:
                 data = response.text
             logger.info("response status: %s", status_code)
             logger.info("response body: %s", data)
@@ -647,7 +742,7 @@ class QuarkClient:
         return stoken
 
     def _now_ms(self) -> int:
-        return int(time.time() * 1000)
+        return time.time_ns() // 1_000_000
 
     def _base_params(self) -> Dict[str, str]:
         return {"pr": "ucpro", "fr": "pc", "uc_param_str": ""}
@@ -656,10 +751,15 @@ class QuarkClient:
         self,
         method: str,
         url: str,
-        headers: Dict[str, str],
+        headers: Optional[Dict[str, str]],
         params: Optional[Dict[str, Any]],
         payload: Optional[Dict[str, Any]],
     ) -> None:
+        # Building the merged header dict is only worth it when it is logged;
+        # httpx merges the client defaults into each request on its own.
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        headers = {**self.client.headers, **(headers or {})}
         logger.info("request method: %s", method)
         logger.info("request url: %s", url)
         logger.info("request headers: %s", headers)
@@ -13,19 +13,10 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from services.workers.quark_client import QuarkClient
 
-async def test_get_stoken():
+async def check_get_stoken(client: QuarkClient):
     """测试get_stoken方法"""
     print("=== 测试get_stoken方法 ===")
     
-    # 从环境变量获取QUARK_COOKIE
-    cookie = os.getenv("QUARK_COOKIE")
-    if not cookie:
-        print("❌ QUARK_COOKIE环境变量未设置")
-        return False
-    
-    # 创建QuarkClient实例
-    client = QuarkClient(cookie)
-    
     # 测试用的分享链接
     test_share_url = "https://pan.quark.cn/s/710a4d0564c4"
     
@@ -37,19 +28,10 @@ async def test_get_stoken():
         print(f"❌ 获取stoken失败: {e}")
         return False, None
 
-async def test_extract_share_info():
+async def check_extract_share_info(client: QuarkClient):
     """测试_extract_share_info方法"""
     print("\n=== 测试_extract_share_info方法 ===")
     
-    # 从环境变量获取QUARK_COOKIE
-    cookie = os.getenv("QUARK_COOKIE")
-    if not cookie:
-        print("❌ QUARK_COOKIE环境变量未设置")
-        return False
-    
-    # 创建QuarkClient实例
-    client = QuarkClient(cookie)
-    
     # 测试用的分享链接
     test_share_url = "https://pan.quark.cn/s/710a4d0564c4"
     
@@ -65,11 +47,19 @@ async def main():
     """主测试函数"""
     print("开始测试夸克云盘转存功能...")
     
-    # 测试get_stoken方法
-    stoken_result, stoken = await test_get_stoken()
+    # 从环境变量获取QUARK_COOKIE
+    cookie = os.getenv("QUARK_COOKIE")
+    if not cookie:
+        print("❌ QUARK_COOKIE环境变量未设置")
+        return 1
     
-    # 测试_extract_share_info方法
-    extract_result, share_code, passcode = await test_extract_share_info()
+    # 所有测试共用一个QuarkClient实例（复用连接池）
+    async with QuarkClient(cookie) as client:
+        # 测试get_stoken方法
+        stoken_result, stoken = await check_get_stoken(client)
+        
+        # 测试_extract_share_info方法
+        extract_result, share_code, passcode = await check_extract_share_info(client)
     
     print("\n=== 测试总结 ===")
     if stoken_result and extract_result:
@@ -1,14 +1,15 @@
 import asyncio
-import json
 import logging
 import os
 import posixpath
+import random
 import sys
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 import httpx
+import orjson
 import redis.asyncio as redis
 from sqlalchemy.exc import SQLAlchemyError
 from tenacity import retry, stop_after_attempt, wait_exponential
@@ -40,6 +41,9 @@ WEBDAV_CACHE_URL = os.getenv(
 )
 HTTP_TIMEOUT = float(os.getenv("TRANSFER_HTTP_TIMEOUT", "30"))
 MAX_RETRIES = int(os.getenv("TRANSFER_MAX_RETRIES", "3"))
+BREAKER_THRESHOLD = int(os.getenv("TRANSFER_BREAKER_THRESHOLD", "5"))
+BREAKER_BASE_DELAY = float(os.getenv("TRANSFER_BREAKER_BASE_DELAY", "5"))
+BREAKER_MAX_DELAY = float(os.getenv("TRANSFER_BREAKER_MAX_DELAY", "300"))
 
 logger = logging.getLogger("transfer_worker")
 
@@ -49,6 +53,16 @@ async def refresh_webdav_cache(client: httpx.AsyncClient) -> None:
     response.raise_for_status()
 
 
+def breaker_delay(consecutive_failures: int) -> float:
+    # Once Quark keeps failing at the network level, pause before the next
+    # task with jittered exponential growth instead of hammering it.
+    if consecutive_failures < BREAKER_THRESHOLD:
+        return 0.0
+    exponent = min(consecutive_failures - BREAKER_THRESHOLD, 16)
+    delay = min(BREAKER_MAX_DELAY, BREAKER_BASE_DELAY * 2 ** exponent)
+    return delay * random.uniform(0.5, 1.0)
+
+
 async def handle_task(
     payload: Dict[str, Any],
     http_client: httpx.AsyncClient,
@@ -152,6 +166,9 @@ async def handle_task(
                 await session.rollback()
             raise
         except QuarkAPIError as exc:
+            # The cached stoken may have expired upstream; fetch a fresh one
+            # on the next attempt.
+            quark_client.invalidate_stoken(share_url)
             await session.rollback()
             media.task_status = TaskStatus.failed
             media.error_message = f"API error: {str(exc)}"
@@ -207,6 +224,7 @@ async def worker_loop() -> None:
     cookie_manager = CookieManager(cookie)
     quark_client = QuarkClient(cookie_manager.cookie)
     classifier = MediaClassifier()
+    network_failures = 0
 
     try:
         await cookie_manager.validate_cookie(quark_client)
@@ -220,7 +238,7 @@ async def worker_loop() -> None:
                             logger.error("cookie validation failed, worker will continue but may fail on API calls")
                     
                     _, raw = await redis_client.blpop(QUEUE_KEY)
-                    payload = json.loads(raw)
+                    payload = orjson.loads(raw)
                     
                     try:
                         await handle_task(
@@ -230,29 +248,36 @@ async def worker_loop() -> None:
                             classifier,
                             redis_client,
                         )
+                        network_failures = 0
                     except (QuarkNetworkError, httpx.TimeoutException, httpx.TransportError) as exc:
+                        network_failures += 1
                         retry_count = payload.get("retry_count", 0)
                         if retry_count < MAX_RETRIES:
                             payload["retry_count"] = retry_count + 1
-                            await redis_client.rpush(QUEUE_KEY, json.dumps(payload))
+                            await redis_client.rpush(QUEUE_KEY, orjson.dumps(payload))
                             logger.warning("task queued for retry %d/%d: media_id=%s", 
                                          retry_count + 1, MAX_RETRIES, payload.get("media_id"))
                         else:
-                            await redis_client.rpush(DEAD_QUEUE_KEY, json.dumps(payload))
+                            await redis_client.rpush(DEAD_QUEUE_KEY, orjson.dumps(payload))
                             logger.error("task moved to dead queue after %d retries: media_id=%s, error=%s",
                                        MAX_RETRIES, payload.get("media_id"), exc)
+                        delay = breaker_delay(network_failures)
+                        if delay:
+                            logger.warning("%d consecutive network failures, pausing %.1fs",
+                                           network_failures, delay)
+                            await asyncio.sleep(delay)
                     except QuarkAuthError as exc:
-                        await redis_client.rpush(DEAD_QUEUE_KEY, json.dumps(payload))
+                        await redis_client.rpush(DEAD_QUEUE_KEY, orjson.dumps(payload))
                         logger.error("authentication error, task moved to dead queue: media_id=%s, error=%s",
                                    payload.get("media_id"), exc)
                         await cookie_manager.validate_cookie(quark_client)
                     except Exception as exc:
-                        await redis_client.rpush(DEAD_QUEUE_KEY, json.dumps(payload))
+                        await redis_client.rpush(DEAD_QUEUE_KEY, orjson.dumps(payload))
                         logger.exception("unexpected error, task moved to dead queue: media_id=%s, error=%s",
                                       payload.get("media_id"), exc)
                     
                     await asyncio.sleep(0.1)
-                except json.JSONDecodeError as exc:
+                except orjson.JSONDecodeError as exc:
                     logger.warning("invalid task payload: %s", exc)
                 except Exception as exc:
                     logger.exception("worker loop error: %s", exc)